@@ -1,23 +1,42 @@
 import os
+import aiohttp
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 import asyncio
 import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 import wavelink
 from typing import Optional
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Configuration
 load_dotenv()
+_log_formatter = logging.Formatter('%(asctime)s [%(levelname)s] - %(message)s')
+_log_handlers = [
+    logging.FileHandler('bot.log', encoding='utf-8'),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+# Records are handed off to a queue and written by a background thread,
+# so logging from event handlers never blocks the event loop on I/O
+_log_queue = queue.SimpleQueue()
+log_listener = QueueListener(_log_queue, *_log_handlers)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    format='%(message)s',
+    handlers=[QueueHandler(_log_queue)]
 )
+logger = logging.getLogger(__name__)
 
 TOKEN = os.getenv('DISCORD_TOKEN')
 if not TOKEN:
@@ -27,6 +46,12 @@ DEFAULT_PREFIX = os.getenv('DEFAULT_PREFIX', '!')
 DEFAULT_VOLUME = int(os.getenv('DEFAULT_VOLUME', 100))
 MAX_PLAYLIST_SIZE = int(os.getenv('MAX_PLAYLIST_SIZE', 100))
 MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', 1000))
+LAVALINK_CONNECT_ATTEMPTS = int(os.getenv('LAVALINK_CONNECT_ATTEMPTS', 5))
+LAVALINK_CONNECT_TIMEOUT = float(os.getenv('LAVALINK_CONNECT_TIMEOUT', 30))
+LAVALINK_BASE_BACKOFF = float(os.getenv('LAVALINK_BASE_BACKOFF', 1))
+LAVALINK_MAX_BACKOFF = float(os.getenv('LAVALINK_MAX_BACKOFF', 30))
+LAVALINK_KEEPALIVE_TIMEOUT = float(os.getenv('LAVALINK_KEEPALIVE_TIMEOUT', 60))
+DISCORD_KEEPALIVE_TIMEOUT = float(os.getenv('DISCORD_KEEPALIVE_TIMEOUT', 75))
 CACHE_DIR = Path(os.getenv('CACHE_DIR', './cache'))
 CACHE_DIR.mkdir(exist_ok=True)
 
@@ -38,7 +63,9 @@ class MusicBot(commands.Bot):
         intents.guilds = True
         intents.guild_messages = True
 
-        super().__init__(command_prefix=DEFAULT_PREFIX, intents=intents)
+        # Hold idle REST connections to Discord open longer so bursts of replies reuse TLS sessions
+        connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=DISCORD_KEEPALIVE_TIMEOUT)
+        super().__init__(command_prefix=DEFAULT_PREFIX, intents=intents, connector=connector)
         self.wavelink_ready_event = asyncio.Event()
 
     @commands.Cog.listener()
@@ -53,37 +80,55 @@ class MusicBot(commands.Bot):
         for extension in extensions:
             try:
                 await self.load_extension(extension)
-                print(f"Loaded {extension}")
+                logger.info("Loaded %s", extension)
             except Exception as e:
-                print(f"Failed to load {extension}: {str(e)}")
-        print(f"Loaded {len(self.commands)} commands total.")
+                logger.error("Failed to load %s: %s", extension, e)
+        logger.info("Loaded %d commands total.", len(self.commands))
+
+    async def connect_lavalink(self):
+        uri = f"http://{os.getenv('LAVALINK_HOST', '127.0.0.1')}:{int(os.getenv('LAVALINK_PORT', '2333'))}"
+        password = os.getenv('LAVALINK_PASSWORD', 'youshallnotpass')
+
+        for attempt in range(LAVALINK_CONNECT_ATTEMPTS):
+            self.wavelink_ready_event.clear()
+            # Keep REST connections to Lavalink open between searches/plays instead of reconnecting
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(
+                limit=100, keepalive_timeout=LAVALINK_KEEPALIVE_TIMEOUT, enable_cleanup_closed=True))
+            try:
+                await asyncio.wait_for(
+                    wavelink.Pool.connect(nodes=[wavelink.Node(uri=uri, password=password, session=session)], client=self),
+                    timeout=LAVALINK_CONNECT_TIMEOUT
+                )
+                # Wait for node to be ready
+                await asyncio.wait_for(self.wavelink_ready_event.wait(), timeout=LAVALINK_CONNECT_TIMEOUT)
+                return
+            except (asyncio.TimeoutError, wavelink.NodeException):
+                # Drop the half-connected node so the next attempt starts clean
+                await wavelink.Pool.close()
+                if not session.closed:
+                    await session.close()
+                if attempt == LAVALINK_CONNECT_ATTEMPTS - 1:
+                    break
+                delay = min(LAVALINK_BASE_BACKOFF * 2 ** attempt, LAVALINK_MAX_BACKOFF) + random.uniform(0, 1)
+                logger.warning("Lavalink connection attempt %d/%d failed, retrying in %.1fs",
+                               attempt + 1, LAVALINK_CONNECT_ATTEMPTS, delay)
+                await asyncio.sleep(delay)
+
+        raise RuntimeError("Failed to connect to Lavalink server. Please ensure it's running.")
 
     async def setup_hook(self):
         try:
-            # Connect to Lavalink
-            await wavelink.Pool.connect(
-                nodes=[
-                    wavelink.Node(
-                        uri=f"http://{os.getenv('LAVALINK_HOST', '127.0.0.1')}:{int(os.getenv('LAVALINK_PORT', '2333'))}",
-                        password=os.getenv('LAVALINK_PASSWORD', 'youshallnotpass')
-                    )
-                ],
-                client=self
-            )
-
-            # Wait for node to be ready
-            try:
-                await asyncio.wait_for(self.wavelink_ready_event.wait(), timeout=30)
-            except asyncio.TimeoutError:
-                raise RuntimeError("Failed to connect to Lavalink server. Please ensure it's running.")            # Load extensions and sync commands
-            await self.load_extensions()            
+            await self.connect_lavalink()
+
+            # Load extensions and sync commands
+            await self.load_extensions()
             await self.tree.sync()
 
         except Exception as e:
             exit(f"Setup failed: {str(e)}")
 
     async def on_ready(self):
-        print(f"Logged in as {self.user}")
+        logger.info("Logged in as %s", self.user)
         await self.change_presence(activity=discord.Activity(
             type=discord.ActivityType.streaming, name="All your data to the NSA"))
 
@@ -95,12 +140,16 @@ async def main():
         exit(f"Bot error: {str(e)}")
 
 if __name__ == "__main__":
+    log_listener.start()
     try:
-        asyncio.run(main())
+        # uvloop's libuv-based loop is a drop-in replacement and cuts per-callback overhead
+        (uvloop.run if uvloop else asyncio.run)(main())
     except KeyboardInterrupt:
-        print("Bot shutdown requested.")
+        logger.info("Bot shutdown requested.")
     except Exception as e:
-        print(f"Fatal error: {str(e)}")
+        logger.error("Fatal error: %s", e)
+    finally:
+        log_listener.stop()
 
 
 
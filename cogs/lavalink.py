@@ -2,111 +2,328 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import wavelink
-import re
-import math
 import asyncio
+import contextlib
+import functools
+import itertools
 import os
-from typing import Optional, Union
+import time
+import weakref
+from collections import OrderedDict
+from typing import Optional
 
-URL_REGEX = re.compile(r'https?://(?:www\.)?.+')
+DEFAULT_VOLUME = int(os.getenv('DEFAULT_VOLUME', 100))
+MAX_QUEUE_SIZE = int(os.getenv('MAX_QUEUE_SIZE', 1000))
+MAX_PLAYLIST_SIZE = int(os.getenv('MAX_PLAYLIST_SIZE', 100))
+SEARCH_CACHE_TTL = 300
+SEARCH_CACHE_MAX = 512
+EMBED_DESCRIPTION_LIMIT = 4096
+QUEUE_VIEW_TIMEOUT = 120
+# Commands that need a live Lavalink node; the rest only touch local player state
+LAVALINK_COMMANDS = frozenset({"stream", "skip"})
 
-def format_duration(milliseconds: Optional[Union[int, float]]) -> str:
-    if milliseconds is None:
-        return "0:00"
-    try:
-        ms = int(float(milliseconds))
-    except (ValueError, TypeError):
-        return "Invalid"
+@functools.lru_cache(maxsize=2048)
+def escape_markdown(text: str) -> str:
+    # Titles repeat across queue renders and looped playback, so memoize the escape
+    return discord.utils.escape_markdown(text)
 
-    seconds_total = math.floor(ms / 1000)
-    hours = math.floor(seconds_total / 3600)
-    minutes = math.floor((seconds_total % 3600) / 60)
-    seconds = seconds_total % 60
+def format_mention(user_id: int) -> str:
+    return f"<@{user_id}>"
 
-    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours > 0 else f"{minutes}:{seconds:02d}"
+def is_url(query: str) -> bool:
+    return query.startswith(("http://", "https://"))
+
+def queue_embed(player: wavelink.Player, start: int, page_size: int) -> tuple[discord.Embed, int]:
+    embed = discord.Embed(title="Queue", color=discord.Color.blue())
+
+    if player.current:
+        now_playing = f"**{escape_markdown(player.current.title)}**"
+        # extras is an ExtrasNamespace, not a dict; tracks queued elsewhere may carry no requester
+        requester = getattr(player.current.extras, 'requester', None)
+        if requester:
+            now_playing += f"\nRequested by: {format_mention(requester)}"
+        embed.add_field(name="Now Playing", value=now_playing, inline=False)
+
+    total_items = player.queue.count
+    page_tracks = list(itertools.islice(player.queue, start, start + page_size))
+    shown = []
+    # Keep room for the "... and N more" line in case the page has to be cut short
+    budget = EMBED_DESCRIPTION_LIMIT - len(f"\n... and {page_size} more on the next page")
+    length = -1
+    for i, track in enumerate(page_tracks, start=start + 1):
+        row = f"{i}. **{escape_markdown(track.title)}**"
+        # Stop before the rows (plus joining newlines) overflow Discord's description limit
+        length += len(row) + 1
+        if length > budget:
+            break
+        shown.append(row)
+
+    rendered = len(shown)
+    hidden = len(page_tracks) - rendered
+    if hidden:
+        # The next page starts at the first row cut here, so nothing is skipped
+        shown.append(f"... and {hidden} more on the next page")
+
+    embed.description = "\n".join(shown) if shown else "Nothing in queue"
+    if rendered and (start or rendered < total_items):
+        embed.set_footer(text=f"Songs {start + 1}-{start + rendered} of {total_items}")
+    # The caller starts the next page at start + rendered
+    return embed, rendered
+
+class QueueView(discord.ui.View):
+    def __init__(self, interaction: discord.Interaction, player: wavelink.Player, page_size: int):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.interaction = interaction
+        self.player = player
+        self.page_size = page_size
+        # Start offset of every page shown so far; a page ends wherever the embed limit cut it
+        self.offsets = [0]
+        self.rendered = 0
+
+    def render(self) -> discord.Embed:
+        # The queue keeps changing underneath the view, so drop pages that now start past its end
+        while len(self.offsets) > 1 and self.offsets[-1] >= self.player.queue.count:
+            self.offsets.pop()
+        embed, self.rendered = queue_embed(self.player, self.offsets[-1], self.page_size)
+        return embed
+
+    async def show_page(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(emoji="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.offsets) > 1:
+            self.offsets.pop()
+        await self.show_page(interaction)
+
+    @discord.ui.button(emoji="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        start = self.offsets[-1] + self.rendered
+        if start < self.player.queue.count:
+            self.offsets.append(start)
+        await self.show_page(interaction)
+
+    async def on_timeout(self):
+        try:
+            await self.interaction.edit_original_response(view=None)
+        except discord.HTTPException:
+            pass
 
 class Music(commands.Cog):
+    # Exception type -> user-facing message; subclasses resolve through their MRO
+    _ERROR_FORMATTERS = {
+        app_commands.NoPrivateMessage: lambda e: "This command can only be used in a server.",
+        app_commands.CheckFailure: lambda e: "You can't use this command right now.",
+        wavelink.InvalidNodeException: lambda e: "Music service is unavailable right now.",
+        wavelink.NodeException: lambda e: "Music service connection lost.",
+        wavelink.LavalinkLoadException: lambda e: "Failed to load the track.",
+        # wavelink 3 sets `error` from the Lavalink payload; the bundled docs still call it `reason`
+        wavelink.LavalinkException: lambda e: f"Music service error: {getattr(e, 'error', None) or getattr(e, 'reason', None) or e.status}",
+        wavelink.ChannelTimeoutException: lambda e: "Timed out connecting to the voice channel.",
+        wavelink.InvalidChannelStateException: lambda e: "I can't join or speak in that voice channel.",
+        wavelink.QueueEmpty: lambda e: "The queue is empty.",
+    }
+
+    # Read from the environment once at import; shared by every instance of the cog
+    default_volume = DEFAULT_VOLUME
+    max_queue_size = MAX_QUEUE_SIZE
+    max_playlist_size = MAX_PLAYLIST_SIZE
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.inactivity_timers = {}
-        self.default_volume = int(os.getenv('DEFAULT_VOLUME', 100))
-        self.max_queue_size = int(os.getenv('MAX_QUEUE_SIZE', 1000))
-        self.max_playlist_size = int(os.getenv('MAX_PLAYLIST_SIZE', 100))
+        self.inactivity_timers = weakref.WeakValueDictionary()
+        # guild_id -> asyncio.Lock, dropped once no command is holding or waiting on it
+        self._voice_locks = weakref.WeakValueDictionary()
+        self._inactivity_tasks: set[asyncio.Task] = set()
+        self._node: Optional[wavelink.Node] = None
+        # normalized query -> (timestamp, raw track payloads)
+        self._search_cache: OrderedDict[str, tuple[float, list]] = OrderedDict()
+
+    async def cog_load(self):
+        # The bot waits for the node before loading extensions, so pick it up here
+        try:
+            self._node = wavelink.Pool.get_node()
+        except wavelink.InvalidNodeException:
+            self._node = None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        command = interaction.command
+        if command is None or command.name not in LAVALINK_COMMANDS:
+            return True
+        node = self._node
+        if node is None or node.status is not wavelink.NodeStatus.CONNECTED:
+            await interaction.response.send_message("Music service is unavailable right now.", ephemeral=True)
+            return False
+        return True
+
+    async def cog_app_command_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        original = getattr(error, 'original', error)
+        formatter = None
+        # Walk the MRO so the most specific registered type wins
+        for error_type in type(original).__mro__:
+            formatter = self._ERROR_FORMATTERS.get(error_type)
+            if formatter is not None:
+                break
+        error_message = formatter(original) if formatter else "An unexpected error occurred."
+
+        if interaction.response.is_done():
+            # interaction_check already answered when it rejected the command
+            if isinstance(error, app_commands.CheckFailure):
+                return
+            await interaction.followup.send(error_message, ephemeral=True)
+        else:
+            await interaction.response.send_message(error_message, ephemeral=True)
+
+    @commands.Cog.listener()
+    async def on_wavelink_node_ready(self, payload: wavelink.NodeReadyEventPayload):
+        self._node = payload.node
+
+    @commands.Cog.listener()
+    async def on_wavelink_node_disconnected(self, payload: wavelink.NodeDisconnectedEventPayload):
+        if payload.node is self._node:
+            self._node = None
+
+    async def _cached_search(self, query: str) -> wavelink.Search:
+        query = query.strip()
+        # Search terms are case-insensitive upstream, URLs are not
+        key = query if is_url(query) else query.lower()
+        now = time.monotonic()
+
+        cached = self._search_cache.get(key)
+        if cached and now - cached[0] < SEARCH_CACHE_TTL:
+            self._search_cache.move_to_end(key)
+            # Fresh Playables per hit, since callers set per-request extras on them
+            return [wavelink.Playable(data) for data in cached[1]]
+
+        tracks = await wavelink.Playable.search(query)
+        # Playlists can't be rebuilt from track payloads alone, so only plain results are cached
+        if isinstance(tracks, list) and tracks:
+            self._search_cache[key] = (now, [track.raw_data for track in tracks])
+            self._search_cache.move_to_end(key)
+            while len(self._search_cache) > SEARCH_CACHE_MAX:
+                self._search_cache.popitem(last=False)
+        return tracks
+
+    def _voice_lock_for(self, guild_id: int) -> asyncio.Lock:
+        lock = self._voice_locks.get(guild_id)
+        if lock is None:
+            lock = self._voice_locks[guild_id] = asyncio.Lock()
+        return lock
 
     async def ensure_voice_client(self, interaction: discord.Interaction) -> Optional[wavelink.Player]:
-        if not interaction.guild:
+        guild = interaction.guild
+        if not guild:
             await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
             return None
 
-        if not interaction.user.voice:
+        voice = interaction.user.voice
+        if not voice:
             await interaction.response.send_message("You must be in a voice channel to use this command.", ephemeral=True)
             return None
 
-        player = interaction.guild.voice_client
+        # Acknowledge before queueing on the lock; another command's connect can outlast the 3s window
+        await interaction.response.defer()
+
+        # Serialize the check-and-connect so concurrent commands in a guild can't both join
+        async with self._voice_lock_for(interaction.guild_id):
+            player = guild.voice_client
+
+            if not player:
+                try:
+                    async with contextlib.AsyncExitStack() as stack:
+                        player = await voice.channel.connect(cls=wavelink.Player)
+                        # Leave the channel again if the rest of the setup fails; shielded so a
+                        # cancelled interaction can't interrupt the rollback and strand the player
+                        stack.push_async_callback(lambda: asyncio.shield(player.disconnect()))
+                        player.text_channel = interaction.channel
+                        # Lavalink starts players at 100, so only spend a REST call when the default differs
+                        if self.default_volume != 100:
+                            await player.set_volume(self.default_volume)
+                        stack.pop_all()
+                except discord.ClientException:
+                    await interaction.followup.send("Failed to join voice channel.", ephemeral=True)
+                    return None
 
-        if not player:
-            try:
-                player = await interaction.user.voice.channel.connect(cls=wavelink.Player)
-                player.text_channel = interaction.channel
-                player.volume = self.default_volume
-            except Exception as e:
-                await interaction.response.send_message("Failed to join voice channel.", ephemeral=True)
-                return None
-        
         return player
 
     @commands.Cog.listener()
     async def on_wavelink_track_end(self, payload: wavelink.TrackEndEventPayload):
         player = payload.player
-        if not player or not player.guild:
+        guild = player.guild if player else None
+        if not guild:
             return
 
-        if payload.reason in ('FINISHED', 'LOAD_FAILED') and not player.queue.is_empty:
+        # Lavalink v4 sends camelCase end reasons: finished, loadFailed, stopped, replaced, cleanup.
+        # Player.skip() ends the track as 'stopped', so it advances the queue like a finished track.
+        reason = payload.reason
+        if reason in ('finished', 'loadFailed', 'stopped'):
             try:
                 next_track = player.queue.get()
+            except wavelink.QueueEmpty:
+                if reason != 'loadFailed':
+                    self._schedule_inactivity_check(guild.id)
+                return
+            try:
                 await player.play(next_track)
             except Exception:
                 pass
-        elif payload.reason in ('FINISHED', 'STOPPED') and player.queue.is_empty:
-            self._schedule_inactivity_check(player.guild.id)
 
     def _schedule_inactivity_check(self, guild_id: int):
-        if guild_id in self.inactivity_timers:
-            self.inactivity_timers[guild_id].cancel()
-        task = asyncio.create_task(self._check_inactivity(guild_id, 120))
-        self.inactivity_timers[guild_id] = task
-        task.add_done_callback(lambda t: self.inactivity_timers.pop(guild_id, None))
-
-    async def _check_inactivity(self, guild_id: int, delay: int):
-        await asyncio.sleep(delay)
+        handle = self.inactivity_timers.get(guild_id)
+        if handle:
+            handle.cancel()
+        # A TimerHandle instead of a sleeping Task; only the event loop holds it while it is
+        # scheduled, so the weak mapping drops the entry on its own once it has run
+        loop = asyncio.get_running_loop()
+        self.inactivity_timers[guild_id] = loop.call_later(120, self._inactivity_callback, guild_id)
+
+    def _inactivity_callback(self, guild_id: int):
+        # The loop only keeps weak references to tasks, so hold on to it until it finishes
+        task = asyncio.create_task(self._check_inactivity(guild_id))
+        self._inactivity_tasks.add(task)
+        task.add_done_callback(self._inactivity_tasks.discard)
+
+    async def _check_inactivity(self, guild_id: int):
         guild = self.bot.get_guild(guild_id)
         if not guild:
             return
 
-        player = guild.voice_client
-        if player and player.connected and not player.playing and player.queue.is_empty:
-            await player.disconnect()
+        async with self._voice_lock_for(guild_id):
+            player = guild.voice_client
+            if player and player.connected and not player.playing and player.queue.is_empty:
+                await player.disconnect()
         
     def cog_unload(self):
-        for task in self.inactivity_timers.values():
-            task.cancel()
+        for handle in list(self.inactivity_timers.values()):
+            handle.cancel()
         self.inactivity_timers.clear()
+        for task in self._inactivity_tasks:
+            task.cancel()
 
     @app_commands.command(name="stream", description="Plays music from Streaming, SoundCloud, or Spotify")
     @app_commands.describe(query='URL or search term')
     async def play(self, interaction: discord.Interaction, *, query: str):
-        player = await self.ensure_voice_client(interaction)
+        # Resolve the query on Lavalink while the defer and voice connect are in flight
+        search_task = asyncio.create_task(self._cached_search(query))
+        player = None
+        try:
+            player = await self.ensure_voice_client(interaction)
+        finally:
+            if not player:
+                search_task.cancel()
         if not player:
             return
-            
-        await interaction.response.defer()
 
         try:
-            tracks = await wavelink.Playable.search(query)
+            tracks = await search_task
             if not tracks:
                 await interaction.followup.send("No results found.", ephemeral=True)
                 return
 
+            if isinstance(tracks, wavelink.Playlist):
+                await self._play_playlist(interaction, player, tracks)
+                return
+
             track = tracks[0]
             track.extras = {'requester': interaction.user.id}
 
@@ -115,23 +332,63 @@ class Music(commands.Cog):
                     await interaction.followup.send("Queue is full.", ephemeral=True)
                     return
                 player.queue.put(track)
-                await interaction.followup.send(f"Queued: **{track.title}**")
+                await interaction.followup.send(f"Queued: **{escape_markdown(track.title)}**")
             else:
                 await player.play(track)
-                await interaction.followup.send(f"Playing: **{track.title}**")
+                await interaction.followup.send(f"Playing: **{escape_markdown(track.title)}**")
 
         except Exception as e:
             await interaction.followup.send("Failed to play track.", ephemeral=True)
 
+    async def _play_playlist(self, interaction: discord.Interaction, player: wavelink.Player, playlist: wavelink.Playlist):
+        # One namespace shared by every track; passing a dict would build a new one per track
+        extras = wavelink.ExtrasNamespace(requester=interaction.user.id)
+        playlist_name = escape_markdown(playlist.name)
+        tracks_from_playlist = playlist.tracks[:self.max_playlist_size]
+
+        first_track = None
+        if not player.playing:
+            first_track = tracks_from_playlist.pop(0)
+            first_track.extras = extras
+            await player.play(first_track)
+
+        queue = player.queue
+        slots = max(0, self.max_queue_size - queue.count)
+        tracks_to_add = tracks_from_playlist[:slots]
+        skipped_full = len(tracks_from_playlist) - len(tracks_to_add)
+        for track in tracks_to_add:
+            track.extras = extras
+        if tracks_to_add:
+            queue.put(tracks_to_add)
+
+        if first_track:
+            lines = [f"Playing: **{escape_markdown(first_track.title)}** (from **{playlist_name}**)"]
+        else:
+            lines = [f"Adding songs from **{playlist_name}**"]
+        if tracks_to_add:
+            lines.append(f"Queued {len(tracks_to_add)} more songs.")
+        if skipped_full:
+            lines.append(f"Queue is full. {skipped_full} songs from **{playlist_name}** were not added.")
+        elif len(playlist.tracks) > self.max_playlist_size:
+            lines.append(f"Only the first {self.max_playlist_size} songs of **{playlist_name}** were added.")
+        await interaction.followup.send("\n".join(lines))
+
     @app_commands.command(name="disconnect", description="Disconnects the bot")
     async def disconnect(self, interaction: discord.Interaction):
-        player = interaction.guild.voice_client
-        if not player:
+        if not interaction.guild.voice_client:
             await interaction.response.send_message("Not connected.", ephemeral=True)
             return
 
-        await player.disconnect()
-        await interaction.response.send_message("Disconnected.")
+        # The lock may be held by a /stream that is still connecting, so acknowledge first
+        await interaction.response.defer()
+        async with self._voice_lock_for(interaction.guild_id):
+            player = interaction.guild.voice_client
+            if not player:
+                await interaction.followup.send("Not connected.", ephemeral=True)
+                return
+
+            await player.disconnect()
+        await interaction.followup.send("Disconnected.")
 
     @app_commands.command(name="skip", description="Skips the current song")
     async def skip(self, interaction: discord.Interaction):
@@ -144,33 +401,20 @@ class Music(commands.Cog):
         await interaction.response.send_message("⏭️ Skipped.")
 
     @app_commands.command(name="queue", description="Shows the current queue")
-    async def queue(self, interaction: discord.Interaction):
+    @app_commands.describe(page_size='How many upcoming songs to show per page')
+    async def queue(self, interaction: discord.Interaction, page_size: app_commands.Range[int, 1, 30] = 10):
         player = interaction.guild.voice_client
         if not player:
             await interaction.response.send_message("Not playing anything.", ephemeral=True)
             return
 
-        embed = discord.Embed(title="Queue", color=discord.Color.blue())
-        
-        if player.current:
-            embed.add_field(
-                name="Now Playing",
-                value=f"**{player.current.title}**\nRequested by: <@{player.current.extras.get('requester')}>",
-                inline=False
-            )
-
-        queue_list = []
-        for i, track in enumerate(player.queue, start=1):
-            queue_list.append(f"{i}. **{track.title}**")
-        
-        if queue_list:
-            embed.add_field(name="Up Next", value="\n".join(queue_list[:10]), inline=False)
-            if len(queue_list) > 10:
-                embed.set_footer(text=f"And {len(queue_list) - 10} more...")
+        view = QueueView(interaction, player, page_size)
+        embed = view.render()
+        if view.rendered < player.queue.count:
+            # Page with buttons on this message instead of a new /queue call per page
+            await interaction.response.send_message(embed=embed, view=view)
         else:
-            embed.add_field(name="Up Next", value="Nothing in queue", inline=False)
-
-        await interaction.response.send_message(embed=embed)
+            await interaction.response.send_message(embed=embed)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Music(bot))
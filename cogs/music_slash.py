@@ -1,7 +1,6 @@
 import asyncio
 import functools
 import itertools
-import math
 import random
 import os
 import time
@@ -17,6 +16,9 @@ import traceback
 import json
 import base64
 import io
+import logging
+
+logger = logging.getLogger(__name__)
 
 language = "en"  # en/tc
 useEmbed = False
@@ -73,8 +75,18 @@ FFMPEG_OPTIONS = {
     'options': '-vn',
 }
 
+# Emojis for the search result menu, one per result
+SEARCH_REACTIONS = ("1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟")
+
+# Patterns for parsing seek positions like 1h2m30s, compiled once at import
+SEEK_REGEX = re.compile("([0-9]*h)?([0-9]*m)?([0-9]*s)?", re.ASCII)
+SEEK_HOUR_REGEX = re.compile("([0-9]+h)", re.ASCII)
+SEEK_MINUTE_REGEX = re.compile("([0-9]+m)", re.ASCII)
+SEEK_SECOND_REGEX = re.compile("([0-9]+s)", re.ASCII)
+
 
 # Parse the duration to xx days xx hours xx minutes xx seconds
+@functools.lru_cache(maxsize=4096)
 def parse_duration(duration: int):
     minutes, seconds = divmod(duration, 60)
     hours, minutes = divmod(minutes, 60)
@@ -94,6 +106,7 @@ def parse_duration(duration: int):
 
 
 # Parse the duration to 00:00:00:00
+@functools.lru_cache(maxsize=4096)
 def parse_duration_raw(duration: int):
     minutes, seconds = divmod(duration, 60)
     hours, minutes = divmod(minutes, 60)
@@ -345,21 +358,14 @@ async def _play(ctx, search, loop, search_msg=None):
 # Invalid parameter "page" will display the first page
 
 def queue_embed(data, page, header, description, song_id):
-    # Get the total duration from the queue or playlist
-    def getTotalDuration(data):
-        total_duration = 0
-        for song in data:
-            total_duration += song["duration"]
-        return total_duration
-
     items_per_page = 5
-    pages = math.ceil(len(data) / items_per_page)
+    pages = -(-len(data) // items_per_page)
     if page < 1:
         page = 1
     page = min(pages, page)
     start = (page - 1) * items_per_page
     end = start + items_per_page
-    queue = ''
+    rows = []
     url = "https://youtu.be/" if song_id == "id" else ""
     # If data has children, iterates through all children and create the body
     if len(data):
@@ -370,28 +376,30 @@ def queue_embed(data, page, header, description, song_id):
                     duration = parse_duration(song['duration'])
                 except:
                     duration = loc["unknown"]
-                queue += loc["queue_embed"]["queue_row_local"].format(i + 1,
-                                                                      title,
-                                                                      duration)
+                rows.append(loc["queue_embed"]["queue_row_local"].format(i + 1,
+                                                                         title,
+                                                                         duration))
             else:
                 try:
                     duration = parse_duration_raw(song['duration'])
                 except:
                     duration = loc["unknown"]
-                queue += loc["queue_embed"]["queue_row"].format(i + 1,
-                                                                song["title"],
-                                                                url,
-                                                                song[song_id],
-                                                                duration)
+                rows.append(loc["queue_embed"]["queue_row"].format(i + 1,
+                                                                   song["title"],
+                                                                   url,
+                                                                   song[song_id],
+                                                                   duration))
+        queue = "".join(rows)
     else:
         queue = loc["queue_embed"]["empty"]
+    # Get the total duration from the queue or playlist in a single pass
+    total_duration = sum(song["duration"] for song in data)
     embed = (discord.Embed(
         title=header,
         description=description)
              .add_field(name=loc["queue_embed"]["embed_body"].format(len(data),
                                                                      parse_duration(
-                                                                         getTotalDuration(
-                                                                             data))),
+                                                                         total_duration)),
                         value=queue)
              .set_footer(text=loc["queue_embed"]["page"].format(page, pages))
              )
@@ -800,7 +808,7 @@ class VoiceState:
             await asyncio.sleep(1)
             guild = self.bot.get_guild(self.guild_id)
             if guild is None:
-                print("[ERROR] Couldn't retrieve guild " + str(self.guild_id))
+                logger.error("Couldn't retrieve guild %s", self.guild_id)
             else:
                 # If the bot is kicked, the voice_client should be None
                 if guild.voice_client:
@@ -950,7 +958,7 @@ class VoiceState:
         else:
             self.forbidden = False
         if error:
-            print(f"Song finished with error: {str(error)}")
+            logger.error("Song finished with error: %s", error)
         # If it is not looping or seeking, clear the current song
         if not self.loop and not self.seeking:
             self.current = None
@@ -1006,14 +1014,12 @@ class SearchMenu(discord.ui.Select):
         self.bot = bot
         self.cog = cog
         self.ctx = ctx
-        reaction_list = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣",
-                         "9️⃣", "🔟"]
         options = [discord.SelectOption(label=data["title"],
                                         description=loc["search_menu"][
                                             "video_length"].format(
                                             data['duration']),
                                         value=str(data["index"]),
-                                        emoji=reaction_list[data["index"]]) for
+                                        emoji=SEARCH_REACTIONS[data["index"]]) for
                    data in options_raw]
         options.append(discord.SelectOption(label=loc["search_menu"]["cancel"],
                                             description=loc["search_menu"][
@@ -1602,15 +1608,13 @@ class Music(commands.Cog):
     async def runningservers(self, interaction: discord.Interaction):
         # Check whether the user id is in the author list
         if interaction.user.id in authors:
-            # Count how many servers are connected to a voice channel
-            server_count, desc = 0, ''
-            for guild_id, voice_state in self.voice_states.items():
-                if voice_state.voice:
-                    server_count += 1
-                    desc += f'{self.bot.get_guild(guild_id).name} / {guild_id}\n'
+            # List the servers that are connected to a voice channel
+            rows = [f'{self.bot.get_guild(guild_id).name} / {guild_id}'
+                    for guild_id, voice_state in self.voice_states.items()
+                    if voice_state.voice]
             return await respond(interaction, embed=discord.Embed(
                 title=loc["messages"]["runningservers"].format(
-                    str(server_count)), description=desc[:-1]))
+                    str(len(rows))), description="\n".join(rows)))
 
     @app_commands.command(name="seek", description=loc["descriptions"]["seek"])
     @app_commands.describe(seconds="Position to seek to (e.g. 1h2m30s, +30s, -10s)")
@@ -1623,17 +1627,16 @@ class Music(commands.Cog):
             try:
                 # Google this regular expression by yourself
                 # It will parse which hour, minute, second to seek to
-                regexp = re.compile("([0-9]*h)?([0-9]*m)?([0-9]*s)?")
-                if regexp.match(seconds).group() != "":
-                    hour_regexp = re.compile("([0-9]+h)").search(seconds)
+                if SEEK_REGEX.match(seconds).group() != "":
+                    hour_regexp = SEEK_HOUR_REGEX.search(seconds)
                     hour_regexp = int(hour_regexp.group()[
                                       0:-1]) if hour_regexp is not None else 0
 
-                    minute_regexp = re.compile("([0-9]+m)").search(seconds)
+                    minute_regexp = SEEK_MINUTE_REGEX.search(seconds)
                     minute_regexp = int(minute_regexp.group()[
                                         0:-1]) if minute_regexp is not None else 0
 
-                    second_regexp = re.compile("([0-9]+s)").search(seconds)
+                    second_regexp = SEEK_SECOND_REGEX.search(seconds)
                     second_regexp = int(second_regexp.group()[
                                         0:-1]) if second_regexp is not None else 0
 
@@ -1,44 +1,128 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import subprocess
+import os
 import platform
+import signal
 import logging
+import asyncio
+import time
+from collections import defaultdict
+from typing import Iterator
 
 logger = logging.getLogger(__name__)
 
-def get_gpu_info():
-    if platform.system() == "Windows":
+GPU_INFO_TTL = 5
+SSH_CLIENTS_TTL = 10
+COMMAND_TIMEOUT = 5
+
+# command name -> (timestamp, output)
+_command_cache: dict[str, tuple[float, str]] = {}
+_command_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+async def run_cached(key, ttl, func):
+    """Awaits a helper coroutine, sharing fresh results and in-flight calls per key."""
+    cached = _command_cache.get(key)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+
+    async with _command_locks[key]:
+        # Another caller may have refreshed the entry while we waited
+        cached = _command_cache.get(key)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        result = await func()
+        _command_cache[key] = (time.monotonic(), result)
+        return result
+
+async def _kill_tree(proc):
+    """Terminates a timed out command together with any helpers it forked."""
+    if os.name != 'posix':
+        proc.kill()
+        await proc.wait()
+        return
+
+    # The command leads its own session, so its process group id is its pid
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        await asyncio.wait_for(proc.wait(), timeout=1)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
         try:
-            result = subprocess.run(['nvidia-smi'], capture_output=True, text=True, check=True)
-            return result.stdout
-        except FileNotFoundError:
-            return "NVIDIA GPU information is not available (nvidia-smi not found)"
-        except subprocess.CalledProcessError:
-            return "Failed to retrieve GPU information"
-    else:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+async def run_command(*argv, timeout=COMMAND_TIMEOUT):
+    """Runs a command without blocking the event loop and returns its exit code and stdout."""
+    proc = await asyncio.create_subprocess_exec(
+        *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        start_new_session=True)
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        await _kill_tree(proc)
+        raise
+    return proc.returncode, stdout.decode(errors='replace')
+
+async def _read_gpu_info():
+    if platform.system() != "Windows":
         return "GPU information is only available on Windows systems"
 
-def get_ssh_clients():
+    try:
+        returncode, output = await run_command('nvidia-smi')
+    except FileNotFoundError:
+        return "NVIDIA GPU information is not available (nvidia-smi not found)"
+    except asyncio.TimeoutError:
+        return "Failed to retrieve GPU information"
+    if returncode != 0:
+        return "Failed to retrieve GPU information"
+    return output
+
+async def _read_ssh_clients():
     if platform.system() != "Linux":
         return "SSH client information is only available on Linux systems"
-        
+
     try:
-        who_result = subprocess.run(['who'], capture_output=True, text=True, check=True)
-        who_clients = [line for line in who_result.stdout.splitlines() if 'pts/' in line]
-        
-        w_result = subprocess.run(['w'], capture_output=True, text=True, check=True)
-        w_clients = [line for line in w_result.stdout.splitlines() if 'ssh' in line]
-        
-        all_clients = list(set(who_clients + w_clients))
-        return "\n".join(all_clients) if all_clients else "No users connected via SSH."
-    except subprocess.CalledProcessError:
+        who_code, who_output = await run_command('who')
+        w_code, w_output = await run_command('w')
+    except (FileNotFoundError, asyncio.TimeoutError):
         return "Failed to retrieve SSH client information"
+    if who_code != 0 or w_code != 0:
+        return "Failed to retrieve SSH client information"
+
+    # Keyed by (user, tty) so a session reported by both commands is listed once, in first-seen order
+    clients: dict[tuple[str, str], str] = {}
+    for output, marker in ((who_output, 'pts/'), (w_output, 'ssh')):
+        for line in output.splitlines():
+            if marker not in line:
+                continue
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            clients.setdefault((parts[0], parts[1]), line.strip())
 
-def split_message(message, max_length=2000):
-    """Splits a long message into chunks that are within Discord's message length limit."""
+    return "\n".join(clients.values()) if clients else "No users connected via SSH."
+
+async def get_gpu_info():
+    return await run_cached("gpuinfo", GPU_INFO_TTL, _read_gpu_info)
+
+async def get_ssh_clients():
+    return await run_cached("users", SSH_CLIENTS_TTL, _read_ssh_clients)
+
+def split_message(message, max_length=2000) -> Iterator[str]:
+    """Yields chunks of a long message that are within Discord's message length limit."""
     max_length -= 8  # Account for code block syntax
-    return [message[i:i+max_length] for i in range(0, len(message), max_length)]
+    for i in range(0, len(message), max_length):
+        yield message[i:i+max_length]
+
+async def send_chunks(interaction: discord.Interaction, message):
+    """Sends each chunk as a followup, in order so multi-part tables stay readable."""
+    # Followups share one webhook rate limit, so concurrent sends would not finish any sooner
+    for chunk in split_message(message):
+        await interaction.followup.send(f"```{chunk}```")
 
 class System(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -47,16 +131,14 @@ class System(commands.Cog):
     @app_commands.command(name="gpuinfo", description="Shows NVIDIA GPU information (Windows only)")
     async def gpuinfo(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        gpu_info = get_gpu_info()
-        for chunk in split_message(gpu_info):
-            await interaction.followup.send(f"```{chunk}```")
+        gpu_info = await get_gpu_info()
+        await send_chunks(interaction, gpu_info)
 
     @app_commands.command(name="users", description="Shows connected SSH users (Linux only)")
     async def users(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        ssh_clients_info = get_ssh_clients()
-        for chunk in split_message(ssh_clients_info):
-            await interaction.followup.send(f"```{chunk}```")
+        ssh_clients_info = await get_ssh_clients()
+        await send_chunks(interaction, ssh_clients_info)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(System(bot))